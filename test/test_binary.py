@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+#   ZX Spectrum Emulator.
+#   https://github.com/kosarev/zx
+#
+#   Copyright (C) 2017-2021 Ivan Kosarev.
+#   ivan@kosarev.info
+#
+#   Published under the MIT license.
+
+
+import unittest
+
+
+# Mixes string and tuple fields as well as byte-sized,
+# multi-value and little-endian ones.
+_FORMAT = ['B:id',
+           '<H:size',
+           ('name', '4s'),
+           '3B:rgb',
+           ('offset', '<L')]
+
+_VALUES = dict(id=0x30, size=0x1234, name=b'Z80\x00',
+               rgb=(1, 2, 3), offset=0x89abcdef)
+
+_IMAGE = (b'\x30' b'\x34\x12' b'Z80\x00' b'\x01\x02\x03'
+          b'\xef\xcd\xab\x89')
+
+
+class test_binary_write(unittest.TestCase):
+    def runTest(self):
+        from zx._binary import BinaryWriter
+        writer = BinaryWriter()
+        writer.write(_FORMAT, **_VALUES)
+        assert writer.get_image() == _IMAGE
+
+
+class test_binary_parse(unittest.TestCase):
+    def runTest(self):
+        from zx._binary import BinaryParser
+        parser = BinaryParser(_IMAGE + b'\xff')
+        assert parser.parse(_FORMAT) == _VALUES
+        assert parser.parse_field('B', 'tail') == 0xff
+        assert parser.is_eof()
+
+
+class test_binary_round_trip(unittest.TestCase):
+    def runTest(self):
+        from zx._binary import BinaryParser, BinaryWriter
+        writer = BinaryWriter()
+        for i in range(3):
+            writer.write(_FORMAT, **dict(_VALUES, id=i))
+
+        # Cached formats shall be reused as is.
+        parser = BinaryParser(writer.get_image())
+        for i in range(3):
+            assert parser.parse(_FORMAT) == dict(_VALUES, id=i)
+        assert parser.is_eof()
+
+
+class test_binary_stream_write(unittest.TestCase):
+    def runTest(self):
+        import io
+        from zx._binary import BinaryWriter
+        stream = io.BytesIO()
+        writer = BinaryWriter(stream)
+        writer.write(_FORMAT, **_VALUES)
+        writer.write_block(b'\xff')
+        assert stream.getvalue() == _IMAGE + b'\xff'
+        assert writer.get_image() == b''
+
+
+class test_binary_image_too_short(unittest.TestCase):
+    def runTest(self):
+        from zx._binary import BinaryParser
+        from zx._error import Error
+        parser = BinaryParser(_IMAGE[:-1])
+        with self.assertRaises(Error):
+            parser.parse(_FORMAT)
+
+
+if __name__ == '__main__':
+    unittest.main()
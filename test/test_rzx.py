@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+#   ZX Spectrum Emulator.
+#   https://github.com/kosarev/zx
+#
+#   Copyright (C) 2017-2021 Ivan Kosarev.
+#   ivan@kosarev.info
+#
+#   Published under the MIT license.
+
+
+import unittest
+
+
+_CREATOR = b'zx'.ljust(20, b'\x00')
+_SNAPSHOT_IMAGE = bytes(range(30))
+_FRAMES = [(100, b''),
+           (200, b'\x01'),
+           (300, b'\x02\x03\x04')]
+
+
+def _make_recording(with_snapshot=True):
+    chunks = [{'id': 'info',
+               'creator': _CREATOR,
+               'creator_major_version': 1,
+               'creator_minor_version': 2}]
+    if with_snapshot:
+        chunks.append({'id': 'snapshot', 'image': _SNAPSHOT_IMAGE})
+    chunks.append({'id': 'port_samples', 'first_tick': 0,
+                   'frames': _FRAMES})
+    return {'id': 'input_recording', 'chunks': chunks}
+
+
+def _get_expected_image(with_snapshot=True):
+    import struct
+    image = b'RZX!\x00\x0c' + struct.pack('<L', 0)
+
+    info = _CREATOR + struct.pack('<HH', 1, 2)
+    image += struct.pack('<BL', 0x10, 5 + len(info)) + info
+
+    if with_snapshot:
+        snapshot = (struct.pack('<L4sL', 0, b'Z80\x00',
+                                len(_SNAPSHOT_IMAGE)) +
+                    _SNAPSHOT_IMAGE)
+        image += struct.pack('<BL', 0x30, 5 + len(snapshot)) + snapshot
+
+    recording = struct.pack('<LBLL', len(_FRAMES), 0, 0, 0)
+    for num_of_fetches, samples in _FRAMES:
+        recording += struct.pack('<HH', num_of_fetches, len(samples))
+        recording += samples
+    image += struct.pack('<BL', 0x80, 5 + len(recording)) + recording
+
+    return image
+
+
+class test_make_rzx(unittest.TestCase):
+    def runTest(self):
+        from zx._rzx import make_rzx
+        assert make_rzx(_make_recording()) == _get_expected_image()
+
+
+class test_write_rzx(unittest.TestCase):
+    def runTest(self):
+        import io
+        from zx._rzx import write_rzx
+        stream = io.BytesIO()
+        write_rzx(_make_recording(), stream)
+        assert stream.getvalue() == _get_expected_image()
+
+
+# The size of the input recording block is computed ahead of
+# streaming its frames.
+class test_input_recording_block_size(unittest.TestCase):
+    def runTest(self):
+        import struct
+        from zx._rzx import make_rzx
+        image = make_rzx(_make_recording(with_snapshot=False))
+
+        pos = 10 + 5 + len(_CREATOR) + 4
+        id, size = struct.unpack_from('<BL', image, pos)
+        assert id == 0x80
+        assert size == 5 + 13 + sum(4 + len(samples)
+                                    for _, samples in _FRAMES)
+        assert pos + size == len(image)
+
+
+class test_rzx_round_trip(unittest.TestCase):
+    def runTest(self):
+        from zx._rzx import _parse_rzx, make_rzx
+        recording = _make_recording(with_snapshot=False)
+        assert _parse_rzx(make_rzx(recording)) == recording
+
+
+# Plays back a recording of the given frames with a program that
+# reads ports and stores the read values, one after another.
+def _play_back(frames):
+    import os
+    import tempfile
+    import zx
+    from zx._rzx import make_rzx
+
+    recording = _make_recording(with_snapshot=False)
+    recording['chunks'][-1]['frames'] = frames
+
+    with tempfile.TemporaryDirectory() as dir:
+        filename = os.path.join(dir, 'recording.rzx')
+        with open(filename, 'wb') as f:
+            f.write(make_rzx(recording))
+
+        mach = zx.Emulator(speed_factor=None)
+        # in a, (0xfe); ld (hl), a; inc hl
+        mach.write(0x8000, b'\xdb\xfe\x77\x23' * 8)
+        mach.pc = 0x8000
+        mach.hl = 0x9000
+        mach.iff1 = mach.iff2 = 0
+        mach._load_file(filename)
+
+    try:
+        mach.run()
+    except zx.EmulationExit:
+        pass
+    return mach
+
+
+class test_playback_samples(unittest.TestCase):
+    def runTest(self):
+        mach = _play_back([(6, b'\x01\x02'),
+                           (9, b'\x03\x04\x05')])
+        assert mach.read(0x9000, 5) == b'\x01\x02\x03\x04\x05'
+
+        # The samples of the last frame have all been read by
+        # the machine itself.
+        assert mach.get_num_of_used_playback_samples() == 3
+
+
+class test_too_few_playback_samples(unittest.TestCase):
+    def runTest(self):
+        from zx._error import Error
+        with self.assertRaises(Error) as cm:
+            _play_back([(9, b'\x01\x02')])
+        assert cm.exception.id == 'too_few_input_samples'
+        assert 'Given 2, used 3.' in str(cm.exception)
+
+
+class test_too_many_playback_samples(unittest.TestCase):
+    def runTest(self):
+        from zx._error import Error
+        with self.assertRaises(Error) as cm:
+            _play_back([(3, b'\x01\x02')])
+        assert cm.exception.id == 'too_many_input_samples'
+        assert 'Given 2, used 1.' in str(cm.exception)
+
+
+if __name__ == '__main__':
+    unittest.main()
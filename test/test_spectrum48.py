@@ -58,6 +58,15 @@ class test_get_frame_pixels(unittest.TestCase):
         assert len(pixels) == 394240
 
 
+class test_get_frame_rgb565_pixels(unittest.TestCase):
+    def runTest(self):
+        import zx
+        mach = zx.Spectrum48()
+        mach.render_screen()
+        pixels = mach._get_frame_rgb565_pixels()
+        assert len(pixels) == 197120
+
+
 class test_execute_frame(unittest.TestCase):
     def runTest(self):
         import zx
@@ -83,5 +92,165 @@ class test_keyboard(unittest.TestCase):
 '''
 
 
+class test_screen_updated(unittest.TestCase):
+    def runTest(self):
+        from zx._device import Device, ScreenUpdated
+        from zx._emulator import Emulator
+        from zx._machine import Dispatcher
+
+        frames = []
+
+        class Screen(Device):
+            def on_event(self, event, devices, result):
+                if isinstance(event, ScreenUpdated):
+                    frames.append(len(event.pixels))
+                return result
+
+        mach = Emulator(speed_factor=None, devices=Dispatcher([Screen()]))
+        mach.run(duration=1 / 50)
+        assert frames == [394240]
+
+
+# Executes 'in a, (0xfe)' with the given high byte of the port
+# address, starting at the given tick.
+def _read_port(mach, hi, tick=1000):
+    mach.write(0x8000, b'\xdb\xfe')
+    mach.suppress_interrupts = True
+    mach.pc = 0x8000
+    mach.af = hi << 8
+    mach.ticks_since_int = tick
+    mach.fetches_limit = 1
+    mach.run()
+    return mach.a
+
+
+# Returns the tick at which the port is read if the instruction
+# starts at the given tick.
+def _get_port_read_tick(mach, tick=1000):
+    ticks = []
+
+    def on_input(addr):
+        ticks.append(mach.ticks_since_int)
+        return 0xff
+
+    mach.set_on_input_callback(on_input)
+    _read_port(mach, 0x7f, tick)
+    mach.set_on_input_callback(None)
+
+    read_tick, = ticks
+    return read_tick
+
+
+class test_get_frame_pixels_renders_frame(unittest.TestCase):
+    def runTest(self):
+        from zx._machine import Spectrum48
+        mach = Spectrum48()
+
+        # Installs the border colour.
+        mach.border_color = 1
+        mach.write(0x8000, b'\x00')  # nop
+        mach.pc = 0x8000
+        mach.fetches_limit = 1
+        mach.run()
+
+        # No render_screen() call is necessary.
+        pixels = mach.get_frame_pixels()
+        assert pixels.readonly
+        assert pixels.cast('I')[0] == 0x0000cc
+
+        pixels = mach._get_frame_rgb565_pixels()
+        assert pixels.cast('H')[0] == 0x0019
+
+
+class test_native_keyboard(unittest.TestCase):
+    def runTest(self):
+        from zx._keyboard import KEYS, Keyboard
+        from zx._machine import Spectrum48
+        mach = Spectrum48()
+        mach.set_on_input_callback(None)
+        keyboard = Keyboard(mach._get_keyboard_state_view())
+
+        for id in ('Q', 'CS', 'SPACE', 'L'):
+            keyboard.handle_key_stroke(KEYS[id], pressed=True)
+        keyboard.handle_key_stroke(KEYS['L'], pressed=False)
+
+        for hi in (0xff, 0xfe, 0xfb, 0x7f, 0xbf, 0x7a, 0x00):
+            expected = keyboard.read_port((hi << 8) | 0xfe) & 0xbf
+            assert _read_port(mach, hi) == expected, hex(hi)
+
+
+class test_native_tape_edges(unittest.TestCase):
+    def runTest(self):
+        import array
+        from zx._machine import Spectrum48
+        mach = Spectrum48()
+
+        offset = _get_port_read_tick(mach) - 1000
+
+        level_requests = []
+
+        def get_tape_level():
+            level_requests.append(mach.ticks_since_int)
+            return True
+
+        mach.set_tape_level_callback(get_tape_level)
+
+        def read_level(read_tick):
+            n = _read_port(mach, 0xff, read_tick - offset)
+            return 1 if n & 0x40 else 0
+
+        edges = array.array('i', [2000, 3000, 5000])
+        mach.set_tape_edges(False, edges, 6000)
+
+        # Ticks before, on and after every edge, in order.
+        for read_tick, level in [(1000, 0), (1999, 0),
+                                 (2000, 1), (2001, 1),
+                                 (2999, 1), (3000, 0), (3001, 0),
+                                 (4999, 0), (5000, 1), (5001, 1),
+                                 (6000, 1)]:
+            assert read_level(read_tick) == level, read_tick
+        assert not level_requests
+
+        # Going back in the frame.
+        assert read_level(2500) == 1
+        assert read_level(1500) == 0
+        assert read_level(5500) == 1
+        assert not level_requests
+
+        # Past the last covered tick the level is requested.
+        assert read_level(6001) == 1
+        assert level_requests == [6001]
+
+        # Sending the table again resets the walk along the
+        # edges.
+        del level_requests[:]
+        edges = array.array('i', [4000])
+        mach.set_tape_edges(True, edges, 8000)
+        for read_tick, level in [(3999, 1), (4000, 0),
+                                 (3000, 1), (7000, 0)]:
+            assert read_level(read_tick) == level, read_tick
+        assert not level_requests
+
+        with self.assertRaises(TypeError):
+            mach.set_tape_edges(False, array.array('d', [1.0]), 0)
+
+
+class test_derived_event(unittest.TestCase):
+    def runTest(self):
+        from zx._device import ToggleEmulationPause
+        from zx._machine import Dispatcher, Spectrum48
+
+        class TogglePause(ToggleEmulationPause):
+            pass
+
+        mach = Spectrum48()
+        mach.devices = Dispatcher([mach])
+        assert not mach.paused
+        mach.devices.notify(TogglePause())
+        assert mach.paused
+        mach.devices.notify(TogglePause())
+        assert not mach.paused
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+#   ZX Spectrum Emulator.
+#   https://github.com/kosarev/zx
+#
+#   Copyright (C) 2017-2021 Ivan Kosarev.
+#   ivan@kosarev.info
+#
+#   Published under the MIT license.
+
+
+import unittest
+
+
+TICKS_PER_FRAME = 69888
+
+
+def _make_tap_file():
+    from zx._tap import TAPFile
+    return TAPFile({'blocks': [b'\x00\x03abc', b'\xff\x01\x02']})
+
+
+# The tick, counted from the moment the tape is started, at
+# which the last pulse is fetched.
+def _get_end_tick(file):
+    pulses = list(file.get_pulses())
+    assert 'END' in pulses[-1][2]
+    return sum(pulse for level, pulse, ids in pulses[:-1])
+
+
+def _start_tape(file):
+    from zx._tape import TapePlayer
+    player = TapePlayer()
+    player.load_parsed_file(file)
+    player.unpause()
+    return player
+
+
+# The tape shall only be reported stopped once the machine
+# reads past the tick at which the last pulse starts, even
+# though pulses are walked through a frame ahead.
+class test_end_of_tape_on_read(unittest.TestCase):
+    def runTest(self):
+        file = _make_tap_file()
+        end_tick = _get_end_tick(file)
+        player = _start_tape(file)
+
+        frame, tick = divmod(end_tick, TICKS_PER_FRAME)
+        for i in range(frame):
+            player.skip_rest_of_frame()
+            assert not player.is_end()
+
+        if tick > 0:
+            player.get_level_at_frame_tick(tick - 1)
+            assert not player.is_end()
+
+        player.get_level_at_frame_tick(tick)
+        assert not player.is_end()
+
+        player.get_level_at_frame_tick(tick + 1)
+        assert player.is_end()
+
+
+# Without reads, the end is reported at the end of the frame
+# that holds the start of the last pulse.
+class test_end_of_tape_on_end_of_frame(unittest.TestCase):
+    def runTest(self):
+        file = _make_tap_file()
+        end_tick = _get_end_tick(file)
+        player = _start_tape(file)
+
+        frame = end_tick // TICKS_PER_FRAME
+        for i in range(frame):
+            player.skip_rest_of_frame()
+            assert not player.is_end()
+
+        player.skip_rest_of_frame()
+        assert player.is_end()
+
+
+def _get_frame_levels(player, begin=0, end=TICKS_PER_FRAME):
+    return {player.get_level_at_frame_tick(tick)
+            for tick in range(begin, end, 100)}
+
+
+# Levels of a frame are looked up in its edge table, which is
+# walked ahead of the machine, so pausing and unpausing the
+# tape in the middle of a frame take effect at the next frame.
+class test_pause_in_middle_of_frame(unittest.TestCase):
+    def runTest(self):
+        player = _start_tape(_make_tap_file())
+        player.skip_rest_of_frame()
+
+        half = TICKS_PER_FRAME // 2
+        player.get_level_at_frame_tick(half)
+        player.pause()
+        assert _get_frame_levels(player, half) == {False, True}
+
+        level = player.get_level_at_frame_tick(TICKS_PER_FRAME)
+        player.skip_rest_of_frame()
+        assert _get_frame_levels(player, 0, half) == {level}
+
+        player.unpause()
+        assert _get_frame_levels(player, half) == {level}
+
+        player.skip_rest_of_frame()
+        assert _get_frame_levels(player) == {False, True}
+
+
+class test_no_tape(unittest.TestCase):
+    def runTest(self):
+        from zx._tape import TapePlayer
+        player = TapePlayer()
+        assert player.is_end()
+        player.skip_rest_of_frame()
+        assert player.is_end()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -120,6 +120,8 @@ public:
             cell = static_cast<least_u8>(rnd);
             rnd = (rnd * 0x74392cef) ^ (rnd >> 16);
         }
+
+        init_render_tables();
     }
 
     events_mask get_events() const { return events; }
@@ -364,6 +366,10 @@ public:
     static const unsigned memory_image_size = 0x10000;  // 64K bytes.
     typedef least_u8 memory_image_type[memory_image_size];
 
+    memory_image_type &get_memory_marks() {
+        return memory_marks;
+    }
+
     static const ticks_type ticks_per_frame = 69888;
     static const ticks_type ticks_per_line = 224;
     static const ticks_type ticks_per_active_int = 32;
@@ -437,11 +443,15 @@ public:
         assert(pixel_in_line >= border_width);
         assert(pixel_in_line < border_width + screen_width);
 
+        return get_pixel_pattern_line_addr(frame_line - 64) +
+                   (pixel_in_line - border_width) / 8;
+    }
+
+    static fast_u16 get_pixel_pattern_line_addr(unsigned line) {
         fast_u16 addr = 0x4000;
 
         // Adjust the address according to the third of the
         // screen.
-        unsigned line = frame_line - 64;
         addr += 0x800 * (line / 64);
         line %= 64;
 
@@ -453,9 +463,6 @@ public:
         // character line.
         addr += 0x100 * line;
 
-        // Finally, apply the offset in line.
-        addr += (pixel_in_line - border_width) / 8;
-
         return addr;
     }
 
@@ -485,6 +492,10 @@ public:
         static_assert(pixels_per_frame_chunk == 8,
                       "Unsupported frame chunk format!");
 
+        // Don't waste time on frames no one is going to see.
+        if(!screen_rendering_enabled)
+            return;
+
         // TODO: Render the border by whole chunks when possible.
         while(render_tick < end_tick) {
             // The tick since the beam was at the imaginary
@@ -502,8 +513,9 @@ public:
                 pixel_in_line >= border_width - 8 &&
                 pixel_in_line < border_width + screen_width - 8;
             if(is_screen_latching_area && render_tick % 8 == 0) {
-                fast_u16 pattern_addr = get_pixel_pattern_addr(
-                    frame_line, pixel_in_line + 8);
+                fast_u16 pattern_addr = static_cast<fast_u16>(
+                    pixel_pattern_line_addrs[frame_line - 64] +
+                        (pixel_in_line + 8 - border_width) / 8);
                 // TODO
                 // printf("%d -> 0x%04x\n", (int) render_tick, (unsigned) addr);
                 latched_pixel_pattern = make16(on_read(pattern_addr),
@@ -538,22 +550,17 @@ public:
                     latched_colour_attrs2 = latched_colour_attrs;
                 }
 
-                auto attr = static_cast<unsigned>(latched_colour_attrs2 >> ((15 - pixel_in_cycle) / 8 * 8));
-                unsigned brightness = attr >> (6 - brightness_bit) & brightness_mask;
-                unsigned ink_color = ((attr >> 0) & 0x7) | brightness;
-                unsigned paper_color = ((attr >> 3) & 0x7) | brightness;
+                auto attr = static_cast<unsigned>(latched_colour_attrs2 >> ((15 - pixel_in_cycle) / 8 * 8)) & 0xff;
 
                 // TODO: We can compute the whole chunk as soon
                 //       as we read the bytes. And then just
                 //       apply them here.
-                unsigned pixels_value = 0;
                 fast_u16 pattern = latched_pixel_pattern2;
                 if((attr & 0x80) != 0)
                     pattern ^= flash_mask;
-                pixels_value |= (pattern & ((1u << 15) >> pixel_in_cycle)) != 0 ?
-                    (ink_color << 28) : (paper_color << 28);
-                pixels_value |= (pattern & ((1u << 14) >> pixel_in_cycle)) != 0 ?
-                    (ink_color << 24) : (paper_color << 24);
+                unsigned pixel_pair = (pattern >> (14 - pixel_in_cycle)) & 0x3;
+                unsigned pixels_value = static_cast<unsigned>(
+                    pixel_pairs[attr][pixel_pair]) << 24;
                 pixels_value >>= pixel_in_chunk * 4;
 
                 // printf("%d, pixel_in_cycle %d\n", (int) render_tick, (int) pixel_in_cycle);
@@ -613,29 +620,40 @@ public:
         render_screen_to_tick(ticks_per_frame);
     }
 
+    // Native-endian xRGB8888 pixels.
     typedef uint_least32_t pixel_type;
     typedef pixel_type pixels_buffer_type[frame_height][frame_width];
     static const std::size_t pixels_buffer_size = sizeof(pixels_buffer_type);
 
-    void get_frame_pixels(pixels_buffer_type &buffer) {
+    // Native-endian RGB565 pixels. Sixteen colours do not
+    // need more, and it halves the amount of data to move.
+    typedef uint_least16_t rgb565_pixel_type;
+    typedef rgb565_pixel_type rgb565_pixels_buffer_type[frame_height][frame_width];
+
+    template<typename P>
+    void get_frame_pixels(P (&buffer)[frame_height][frame_width]) {
         static_assert(is_multiple_of(frame_width, pixels_per_frame_chunk),
                       "Fractional number of chunks per line is not supported!");
         static_assert(bits_per_frame_pixel == 4,
                       "Unsupported frame pixel format!");
         static_assert(pixels_per_frame_chunk == 8,
                       "Unsupported frame chunk format!");
-        pixel_type *pixels = *buffer;
+        P palette[16];
+        for(unsigned c = 0; c != 16; ++c)
+            translate_color(c, palette[c]);
+
+        P *pixels = *buffer;
         std::size_t p = 0;
         for(const auto &screen_line : screen_chunks) {
             for(auto chunk : screen_line) {
-                pixels[p++] = translate_color((chunk >> 28) & 0xf);
-                pixels[p++] = translate_color((chunk >> 24) & 0xf);
-                pixels[p++] = translate_color((chunk >> 20) & 0xf);
-                pixels[p++] = translate_color((chunk >> 16) & 0xf);
-                pixels[p++] = translate_color((chunk >> 12) & 0xf);
-                pixels[p++] = translate_color((chunk >>  8) & 0xf);
-                pixels[p++] = translate_color((chunk >>  4) & 0xf);
-                pixels[p++] = translate_color((chunk >>  0) & 0xf);
+                pixels[p++] = palette[(chunk >> 28) & 0xf];
+                pixels[p++] = palette[(chunk >> 24) & 0xf];
+                pixels[p++] = palette[(chunk >> 20) & 0xf];
+                pixels[p++] = palette[(chunk >> 16) & 0xf];
+                pixels[p++] = palette[(chunk >> 12) & 0xf];
+                pixels[p++] = palette[(chunk >>  8) & 0xf];
+                pixels[p++] = palette[(chunk >>  4) & 0xf];
+                pixels[p++] = palette[(chunk >>  0) & 0xf];
             }
         }
     }
@@ -746,7 +764,7 @@ public:
 protected:
     using base::self;
 
-    pixel_type translate_color(unsigned c) {
+    static void translate_color(unsigned c, pixel_type &pixel) {
         uint_fast32_t r = 0;
         r |= (c & red_mask)   << (16 - red_bit);
         r |= (c & green_mask) << (8 - green_bit);
@@ -755,7 +773,19 @@ protected:
         // TODO: Use the real coefficients.
         r *= (c & brightness_mask) ? 0xff : 0xcc;
 
-        return static_cast<pixel_type>(r);
+        pixel = static_cast<pixel_type>(r);
+    }
+
+    static void translate_color(unsigned c, rgb565_pixel_type &pixel) {
+        // TODO: Use the real coefficients.
+        fast_u8 v = (c & brightness_mask) ? 0xff : 0xcc;
+
+        uint_fast32_t r = 0;
+        r |= (c & red_mask)   ? (v >> 3) << 11 : 0;
+        r |= (c & green_mask) ? (v >> 2) << 5 : 0;
+        r |= (c & blue_mask)  ? (v >> 3) << 0 : 0;
+
+        pixel = static_cast<rgb565_pixel_type>(r);
     }
 
     events_mask events = no_events;
@@ -778,7 +808,35 @@ protected:
 
     bool trace_enabled = false;
 
+    bool screen_rendering_enabled = true;
+
 private:
+    void init_render_tables() {
+        for(unsigned line = 0; line != screen_height; ++line)
+            pixel_pattern_line_addrs[line] = static_cast<least_u16>(
+                get_pixel_pattern_line_addr(line));
+
+        for(unsigned attr = 0; attr != 0x100; ++attr) {
+            unsigned brightness = attr >> (6 - brightness_bit) & brightness_mask;
+            unsigned ink_color = ((attr >> 0) & 0x7) | brightness;
+            unsigned paper_color = ((attr >> 3) & 0x7) | brightness;
+            for(unsigned pair = 0; pair != 4; ++pair) {
+                unsigned left = (pair & 0x2) ? ink_color : paper_color;
+                unsigned right = (pair & 0x1) ? ink_color : paper_color;
+                pixel_pairs[attr][pair] =
+                    static_cast<least_u8>((left << 4) | right);
+            }
+        }
+    }
+
+    // Addresses of the first pixel pattern bytes of screen
+    // lines.
+    least_u16 pixel_pattern_line_addrs[screen_height];
+
+    // Pairs of frame pixels for every colour attribute and
+    // every two pattern bits.
+    least_u8 pixel_pairs[0x100][4];
+
     screen_chunks_type screen_chunks;
     least_u8 memory_marks[memory_image_size] = {};
 };
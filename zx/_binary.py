@@ -13,6 +13,65 @@ import struct
 from ._error import Error
 
 
+class _BinaryFormat(object):
+    def __init__(self, format):
+        self.fields = []
+        codes = []
+        for field in format:
+            if isinstance(field, str):
+                field_format, field_id = field.split(':', maxsplit=1)
+            else:
+                # TODO: Remove this branch once all tuple formats
+                # are eliminated.
+                field_id, field_format = field
+
+            # All the fields are either byte-sized or little-endian,
+            # so the whole format can be packed as a single
+            # little-endian structure.
+            code = field_format.lstrip('<')
+            assert code[0] not in '>!=@', field_format
+            codes.append(code)
+
+            num_of_values = len(struct.unpack(
+                code, bytes(struct.calcsize(code))))
+            self.fields.append((field_id, num_of_values))
+
+        self.struct = struct.Struct('<' + ''.join(codes))
+
+    def unpack(self, block):
+        values = self.struct.unpack(block)
+        res = dict()
+        pos = 0
+        for field_id, num_of_values in self.fields:
+            if num_of_values == 1:
+                res[field_id] = values[pos]
+            else:
+                res[field_id] = values[pos:pos + num_of_values]
+            pos += num_of_values
+        return res
+
+    def pack(self, values):
+        args = []
+        for field_id, num_of_values in self.fields:
+            if num_of_values == 1:
+                args.append(values[field_id])
+            else:
+                args.extend(values[field_id])
+        return self.struct.pack(*args)
+
+
+_BINARY_FORMATS = dict()
+
+
+def _get_binary_format(format):
+    key = tuple(format)
+    binary_format = _BINARY_FORMATS.get(key, None)
+    if binary_format is None:
+        binary_format = _BinaryFormat(format)
+        _BINARY_FORMATS[key] = binary_format
+    return binary_format
+
+
 class BinaryParser(object):
     def __init__(self, image):
         self.image = image
@@ -47,29 +106,26 @@ class BinaryParser(object):
         return value
 
     def parse(self, format):
-        res = dict()
-        for field in format:
-            if isinstance(field, str):
-                field_format, field_id = field.split(':', maxsplit=1)
-            else:
-                # TODO: Remove this branch once all tuple formats
-                # are eliminated.
-                field_id, field_format = field
-            res[field_id] = self.parse_field(field_format, field_id)
-        return res
+        binary_format = _get_binary_format(format)
+        return binary_format.unpack(
+            self.extract_block(binary_format.struct.size))
 
 
 class BinaryWriter(object):
-    def __init__(self):
+    # If a stream is given, blocks are written to it as they come
+    # and not collected into an image.
+    def __init__(self, stream=None):
         self._chunks = []
+        self._stream = stream
 
     def write_block(self, block):
-        self._chunks.append(block)
+        if self._stream is None:
+            self._chunks.append(block)
+        else:
+            self._stream.write(block)
 
     def write(self, format, **values):
-        for field in format:
-            field_format, field_id = field.split(':', maxsplit=1)
-            self.write_block(struct.pack(field_format, values[field_id]))
+        self.write_block(_get_binary_format(format).pack(values))
 
     def get_image(self):
         return b''.join(self._chunks)
@@ -32,6 +32,10 @@ class GetTapeLevel(DeviceEvent):
         self.frame_tick = frame_tick
 
 
+class GetTapeFrameEdges(DeviceEvent):
+    pass
+
+
 # TODO: Combine these into Get/SetState kind of events.
 class GetTapePlayerTime(DeviceEvent):
     pass
@@ -84,15 +88,29 @@ class SaveSnapshot(DeviceEvent):
         self.filename = filename
 
 
+# Frames are only converted into pixels on request, and the
+# pixels are only valid till the machine runs further.
 class ScreenUpdated(DeviceEvent):
-    def __init__(self, pixels):
-        self.pixels = pixels
+    def __init__(self, machine):
+        self.machine = machine
+
+    # RGB24 pixels, as returned by get_frame_pixels().
+    @property
+    def pixels(self):
+        return self.machine.get_frame_pixels()
 
 
 class TapeStateUpdated(DeviceEvent):
     pass
 
 
+# Sent when the emulator has nothing to do till the given
+# time.monotonic() moment. Devices that wait themselves return True.
+class WaitUntil(DeviceEvent):
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+
 class ToggleEmulationPause(DeviceEvent):
     pass
 
@@ -102,5 +120,11 @@ class ToggleTapePause(DeviceEvent):
 
 
 class Device(object):
+    # Returns types of events the device handles, so that the
+    # dispatcher does not bother it with other events. None
+    # means all events.
+    def get_event_types(self):
+        return None
+
     def destroy(self):
         pass
@@ -14,6 +14,7 @@ import time
 from ._data import MachineSnapshot
 from ._data import SoundFile
 from ._device import EndOfFrame
+from ._device import GetTapeFrameEdges
 from ._device import GetTapeLevel
 from ._device import IsTapePlayerPaused
 from ._device import IsTapePlayerStopped
@@ -24,6 +25,7 @@ from ._device import PauseUnpauseTape
 from ._device import QuantumRun
 from ._device import ReadPort
 from ._device import ScreenUpdated
+from ._device import WaitUntil
 from ._error import Error
 from ._except import EmulatorException
 from ._file import parse_file
@@ -35,12 +37,26 @@ from ._machine import RunEvents
 from ._machine import Spectrum48
 from ._playback import PlaybackPlayer
 from ._rzx import RZXFile
+from ._rzx import write_rzx
 from ._tape import TapePlayer
 from ._time import Time
 from ._z80snapshot import Z80SnapshotFormat
 from ._zxb import ZXBasicCompilerProgram
 
 
+# Plain integer masks, so testing events returned by the machine
+# does not involve the enum machinery.
+_END_OF_FRAME = int(RunEvents.END_OF_FRAME)
+_FETCHES_LIMIT_HIT = int(RunEvents.FETCHES_LIMIT_HIT)
+_BREAKPOINT_HIT = int(RunEvents.BREAKPOINT_HIT)
+_END_OF_TAPE = int(RunEvents.END_OF_TAPE)
+
+# Events sent every quantum or frame carry no data, so there is
+# no need to create them again and again.
+_QUANTUM_RUN_EVENT = QuantumRun()
+_END_OF_FRAME_EVENT = EndOfFrame()
+
+
 # TODO: Eliminate this class. Move everything to Spectrum48.
 class Emulator(Spectrum48):
     _SPIN_V0P5_INFO = {'id': 'info',
@@ -48,40 +64,77 @@ class Emulator(Spectrum48):
                        'creator_major_version': 0,
                        'creator_minor_version': 5}
 
-    def __init__(self, speed_factor=1.0, profile=None, devices=None):
+    def __init__(self, speed_factor=1.0, profile=None, devices=None,
+                 screen_rendering=True):
         super().__init__()
 
         # TODO: Double-underscore or make public.
         self._emulation_time = Time()
         self.__speed_factor = speed_factor
+        self.__frame_deadline = time.monotonic()
+
+        self.__events_to_signal = 0
+
+        # Port reads are handled one at a time, so the same event
+        # objects can be reused for all of them.
+        self.__read_port_event = ReadPort(0)
+        self.__get_tape_level_event = GetTapeLevel(0)
 
-        self.__events_to_signal = RunEvents.NO_EVENTS
+        # With the default set of devices, ports are read natively
+        # from the keyboard state shared with the machine and the
+        # tape level edges of the current frame. We only get back
+        # to Python for the tape level past the end of the frame.
+        self.__native_input = devices is None
+
+        # Custom devices may want to see the screen and get
+        # control between quanta.
+        self.__screen_updates = True
+        self.__quantum_runs = True
 
         if devices is None:
-            devices = [self, TapePlayer(), Keyboard()]
+            keyboard = Keyboard(self._get_keyboard_state_view())
+            devices = [self, TapePlayer(), keyboard]
 
             # Don't even create the window on full throttle.
+            # Then there is no one to send frames to, either.
             if self.__speed_factor is not None:
                 devices.append(ScreenWindow())
+            else:
+                self.__screen_updates = False
+                self.__quantum_runs = False
 
             devices = Dispatcher(devices)
 
         self.devices = devices
 
-        self.set_on_input_callback(self.__on_input)
+        # Callers that never look at the screen may save the
+        # machine the work of rendering it. get_frame_pixels()
+        # and render_screen() do not update the frame then.
+        if not screen_rendering:
+            self.enable_screen_rendering(False)
 
         self.__playback_player = None
+        self.__is_spin_v0p5_playback = False
+        self.__tape_edges_needed = False
+        self.__update_input_callbacks()
 
+        # Instructions are marked natively as they execute and
+        # then collected once the emulator is destroyed.
         self.__profile = profile
+
+    def destroy(self):
         if self.__profile:
-            self.set_breakpoints(0, 0x10000)
+            for addr in self.get_visited_instr_addrs():
+                self.__profile.add_instr_addr(addr)
+
+        super().destroy()
 
     # TODO: Double-underscore or make public.
     def _save_snapshot_file(self, format, filename):
         with open(filename, 'wb') as f:
             snapshot = format().make_snapshot(self)
             # TODO: make_snapshot() shall always return a snapshot object.
-            if issubclass(type(snapshot), MachineSnapshot):
+            if isinstance(snapshot, MachineSnapshot):
                 image = snapshot.get_file_image()
             else:
                 image = snapshot
@@ -103,6 +156,7 @@ class Emulator(Spectrum48):
     def __load_tape_to_player(self, file):
         self.devices.notify(LoadTape(file))
         self.__pause_tape()
+        self.__update_input_callbacks()
 
     # TODO: Do we still need?
     def __is_end_of_tape(self):
@@ -117,57 +171,122 @@ class Emulator(Spectrum48):
 
     def __generate_key_strokes(self, *keys):
         for key in self.__translate_key_strokes(keys):
-            strokes = key.split('+')
-            # print(strokes)
-
-            for id in strokes:
-                # print(id)
-                self.devices.notify(KeyStroke(KEYS[id].ID, pressed=True))
+            # Resolve aliases once for both pressing and releasing.
+            ids = [KEYS[id].ID for id in key.split('+')]
+            # print(ids)
+
+            # TODO: Most of the time goes to holding keys. See if
+            #       shorter holds are enough for the ROM to see
+            #       them.
+            for id in ids:
+                self.devices.notify(KeyStroke(id, pressed=True))
                 self.run(duration=0.05, speed_factor=0)
 
-            for id in reversed(strokes):
-                # print(id)
-                self.devices.notify(KeyStroke(KEYS[id].ID, pressed=False))
+            for id in reversed(ids):
+                self.devices.notify(KeyStroke(id, pressed=False))
                 self.run(duration=0.05, speed_factor=0)
 
-    def __on_input(self, addr):
-        # Handle playbacks.
-        if self.__playback_player:
-            sample = None
-            for sample in self.__playback_player.samples:
-                break
-
-            if sample == 'END_OF_FRAME':
-                raise Error(
-                    'Too few input samples at frame %d of %d. '
-                    'Given %d, used %d.' % (
-                        self.__playback_player.playback_frame_count,
-                        len(self.__playback_player.playback_chunk['frames']),
-                        len(self.__playback_player.samples), sample_i),
-                    id='too_few_input_samples')
-
-            # print('__on_input() returns %d' % sample)
-            return sample
+    # The machine reads the samples of the frame natively and
+    # only gets back to us when they are all used.
+    def __start_playback_frame(self):
+        player = self.__playback_player
+        if not player.start_frame():
+            return False
+
+        self.set_playback_samples(player.playback_sample_values)
+        return True
+
+    def __sync_playback_samples(self):
+        self.__playback_player.set_num_of_used_samples(
+            self.get_num_of_used_playback_samples())
+
+    def __on_playback_input(self, addr):
+        self.__sync_playback_samples()
+        sample = self.__playback_player.get_sample()
+
+        if sample is None:
+            num_of_samples = len(
+                self.__playback_player.playback_sample_values)
+            raise Error(
+                'Too few input samples at frame %d of %d. '
+                'Given %d, used %d.' % (
+                    self.__playback_player.playback_frame_count,
+                    len(self.__playback_player.playback_chunk['frames']),
+                    num_of_samples, num_of_samples + 1),
+                id='too_few_input_samples')
+
+        # print('__on_playback_input() returns %d' % sample)
+        return sample
 
+    def __on_input(self, addr):
         # Scan keyboard.
         n = 0xbf
-        n &= self.devices.notify(ReadPort(addr), 0xff)
+        event = self.__read_port_event
+        event.addr = addr
+        n &= self.devices.notify(event, 0xff)
 
         # TODO: Use the tick when the ear value is sampled
         #       instead of the tick of the beginning of the input
         #       cycle.
-        if self.devices.notify(GetTapeLevel(self.ticks_since_int)):
+        if self.__get_tape_level():
             n |= 0x40
 
-        END_OF_TAPE = RunEvents.END_OF_TAPE
-        if END_OF_TAPE in self.__events_to_signal and self.__is_end_of_tape():
-            self.raise_events(END_OF_TAPE)
-            self.__events_to_signal &= ~END_OF_TAPE
-
         # print('0x%04x 0x%02x' % (addr, n))
 
         return n
 
+    def __get_tape_level(self):
+        event = self.__get_tape_level_event
+        event.frame_tick = self.ticks_since_int
+        level = self.devices.notify(event)
+
+        # With custom devices, this is called on every port read,
+        # so only ask for the end of the tape if we are going to
+        # do something about it.
+        if not (self.__native_input or
+                self.__events_to_signal & _END_OF_TAPE):
+            return level
+
+        if self.__is_end_of_tape():
+            if self.__events_to_signal & _END_OF_TAPE:
+                self.raise_events(_END_OF_TAPE)
+                self.__events_to_signal &= ~_END_OF_TAPE
+
+            # The level cannot change anymore.
+            if self.__native_input and not level:
+                self.set_tape_level_callback(None)
+
+        return level
+
+    # Only install the input handler the current mode needs, so
+    # that reading ports does not have to check for the mode.
+    def __update_input_callbacks(self):
+        if self.__playback_player:
+            self.set_on_input_callback(self.__on_playback_input)
+            return
+
+        if not self.__native_input:
+            self.set_on_input_callback(self.__on_input)
+            return
+
+        self.set_on_input_callback(None)
+        self.__update_tape_edges()
+
+    def __update_tape_edges(self):
+        level, edges, end_tick = self.devices.notify(GetTapeFrameEdges())
+
+        # The machine has passed the end of tape and the level
+        # cannot change anymore. Don't bother updating the edges
+        # till another tape is loaded.
+        if self.__is_end_of_tape() and not level and not edges:
+            self.set_tape_level_callback(None)
+            self.__tape_edges_needed = False
+            return
+
+        self.set_tape_level_callback(self.__get_tape_level)
+        self.set_tape_edges(level, edges, end_tick)
+        self.__tape_edges_needed = True
+
     def __save_crash_rzx(self, player, state, chunk_i, frame_i):
         snapshot = Z80SnapshotFormat().make(state)
 
@@ -191,7 +310,7 @@ class Emulator(Spectrum48):
             f.write(snapshot)
 
         with open('__crash.rzx', 'wb') as f:
-            f.write(make_rzx(crash_recording))
+            write_rzx(crash_recording, f)
 
     def __enter_playback_mode(self):
         # Interrupts are supposed to be controlled by the
@@ -200,22 +319,44 @@ class Emulator(Spectrum48):
         self.allow_int_after_ei = True
         # self.enable_trace()
 
+        self.__update_input_callbacks()
+
     # TODO: Double-underscore or make public.
     def _quit_playback_mode(self):
         self.__playback_player = None
+        self.set_playback_samples(None)
 
         self.suppress_interrupts = False
         self.allow_int_after_ei = False
 
+        self.__update_input_callbacks()
+
+    def __wait_for_next_frame(self, speed_factor):
+        # Sleep till the deadline of the next frame rather than for
+        # the whole frame time, so the time spent on emulating the
+        # frame is not added to it.
+        now = time.monotonic()
+        deadline = self.__frame_deadline + (1 / 50) * speed_factor
+        if deadline > now:
+            if not self.devices.notify(WaitUntil(deadline)):
+                time.sleep(deadline - now)
+        else:
+            # Do not try to catch up if we are behind.
+            deadline = now
+        self.__frame_deadline = deadline
+
     def __run_quantum(self, speed_factor=None):
         if speed_factor is None:
             speed_factor = self.__speed_factor
 
-        if self.__playback_player:
-            creator_info = self.__playback_player.find_recording_info_chunk()
+        devices = self.devices
 
         if True:  # TODO
-            self.devices.notify(QuantumRun())
+            if self.__quantum_runs:
+                devices.notify(_QUANTUM_RUN_EVENT)
+
+            # Handling the quantum may quit the playback mode.
+            player = self.__playback_player
 
             # TODO: For debug purposes.
             '''
@@ -232,44 +373,42 @@ class Emulator(Spectrum48):
             if self.paused:
                 # Give the CPU some spare time.
                 if speed_factor:
-                    time.sleep((1 / 50) * speed_factor)
+                    self.__wait_for_next_frame(speed_factor)
                 return
 
-            events = RunEvents(super().run())
-            # TODO: print(events)
+            events = super().run()
+            # TODO: print(RunEvents(events))
 
-            if RunEvents.BREAKPOINT_HIT in events:
+            if events & _BREAKPOINT_HIT:
                 self.on_breakpoint()
 
-                if self.__profile:
-                    pc = self.pc
-                    self.__profile.add_instr_addr(pc)
-
                 # SPIN v0.5 skips executing instructions
                 # of the bytes-saving ROM procedure in
                 # fast save mode.
-                if (self.__playback_player.samples and
-                        creator_info == self._SPIN_V0P5_INFO and
+                if (player and self.__is_spin_v0p5_playback and
                         self.pc == 0x04d4):
                     sp = self.sp
                     ret_addr = self.read16(sp)
                     self.sp = sp + 2
                     self.pc = ret_addr
 
-            if RunEvents.END_OF_FRAME in events:
-                self.render_screen()
-
-                pixels = self.get_frame_pixels()
-                self.devices.notify(ScreenUpdated(pixels))
+            if events & _END_OF_FRAME:
+                if self.__screen_updates:
+                    devices.notify(ScreenUpdated(self))
 
-                self.devices.notify(EndOfFrame())
+                devices.notify(_END_OF_FRAME_EVENT)
                 self._emulation_time.advance(1 / 50)
 
+                if (self.__native_input and not player and
+                        self.__tape_edges_needed):
+                    self.__update_tape_edges()
+
                 if speed_factor:
-                    time.sleep((1 / 50) * speed_factor)
+                    self.__wait_for_next_frame(speed_factor)
+
+            if player and events & _FETCHES_LIMIT_HIT:
+                self.__sync_playback_samples()
 
-            if (self.__playback_player and
-                    RunEvents.FETCHES_LIMIT_HIT in events):
                 # Some emulators, e.g., SPIN, may store an interrupt
                 # point in the middle of a IX- or IY-prefixed
                 # instruction, so we continue until such
@@ -280,63 +419,54 @@ class Emulator(Spectrum48):
 
                 # SPIN doesn't update the fetch counter if the last
                 # instruction in frame is IN.
-                if (self.__playback_player.samples and
-                        creator_info == self._SPIN_V0P5_INFO and
-                        self.__playback_player.playback_sample_i + 1 <
-                        len(self.__playback_player.playback_sample_values)):
+                if (self.__is_spin_v0p5_playback and
+                        player.playback_sample_i + 1 <
+                        len(player.playback_sample_values)):
                     self.fetches_limit = 1
                     return
 
-                sample = None
-                for sample in self.__playback_player.samples:
-                    break
-                if sample != 'END_OF_FRAME':
+                if not player.is_end_of_frame():
                     raise Error(
                         'Too many input samples at frame %d of %d. '
                         'Given %d, used %d.' % (
-                            self.__playback_player.playback_frame_count,
-                            len(self.__playback_player.
-                                playback_chunk['frames']),
-                            len(self.__playback_player.samples),
-                            self.__playback_player.playback_sample_i + 1),
+                            player.playback_frame_count,
+                            len(player.playback_chunk['frames']),
+                            len(player.playback_sample_values),
+                            player.playback_sample_i + 1),
                         id='too_many_input_samples')
 
-                sample = None
-                for sample in self.__playback_player.samples:
-                    break
-                if sample is None:
+                if not self.__start_playback_frame():
                     self.stop()
                     return
 
-                assert sample == 'START_OF_FRAME'
                 self.on_handle_active_int()
 
     def run(self, duration=None, speed_factor=None):
-        end_time = None
-        if duration is not None:
-            end_time = self._emulation_time.get() + duration
+        if duration is None:
+            while True:
+                self.__run_quantum(speed_factor=speed_factor)
 
-        while (end_time is None or
-               self._emulation_time.get() < end_time):
+        get_time = self._emulation_time.get
+        end_time = get_time() + duration
+        while get_time() < end_time:
             self.__run_quantum(speed_factor=speed_factor)
 
     def __load_input_recording(self, file):
         self.__playback_player = PlaybackPlayer(self, file)
         creator_info = self.__playback_player.find_recording_info_chunk()
+        self.__is_spin_v0p5_playback = creator_info == self._SPIN_V0P5_INFO
 
         # SPIN v0.5 alters ROM to implement fast tape loading,
         # but that affects recorded RZX files.
-        if creator_info == self._SPIN_V0P5_INFO:
+        if self.__is_spin_v0p5_playback:
             self.write(0x1f47, b'\xf5')
 
         # The bytes-saving ROM procedure needs special processing.
         self.set_breakpoint(0x04d4)
 
         # Process frames in order.
-        sample = None
-        for sample in self.__playback_player.samples:
-            break
-        assert sample == 'START_OF_FRAME'
+        is_started = self.__start_playback_frame()
+        assert is_started  # TODO
 
     def __reset_and_wait(self):
         self.pc = 0x0000
@@ -395,6 +525,6 @@ class Emulator(Spectrum48):
         self.__unpause_tape()
 
         # Wait till the end of the tape.
-        self.__events_to_signal |= RunEvents.END_OF_TAPE
+        self.__events_to_signal |= _END_OF_TAPE
         while not self.__is_end_of_tape():
             self.__run_quantum(speed_factor=0)
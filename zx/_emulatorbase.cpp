@@ -10,7 +10,10 @@
 
 #include <Python.h>
 
+#include <algorithm>
+#include <cstring>
 #include <new>
+#include <vector>
 
 #include "../zx.h"
 
@@ -83,6 +86,9 @@ class machine_emulator : public zx::spectrum48<machine_emulator> {
 public:
     typedef zx::spectrum48<machine_emulator> base;
 
+    static const unsigned num_of_keyboard_ports = 8;
+    typedef least_u8 keyboard_state_type[num_of_keyboard_ports];
+
     machine_emulator() {
         retrieve_state();
     }
@@ -116,10 +122,21 @@ public:
     }
 
     pixels_buffer_type &get_frame_pixels() {
+        // Make sure the whole frame is rendered.
+        base::render_screen();
+
         base::get_frame_pixels(pixels);
         return pixels;
     }
 
+    rgb565_pixels_buffer_type &get_frame_rgb565_pixels() {
+        // Make sure the whole frame is rendered.
+        base::render_screen();
+
+        base::get_frame_pixels(rgb565_pixels);
+        return rgb565_pixels;
+    }
+
     events_mask run() {
         install_state();
         events_mask events = base::run();
@@ -140,6 +157,44 @@ public:
         return old_callback;
     }
 
+    PyObject *set_tape_level_callback(PyObject *callback) {
+        PyObject *old_callback = tape_level_callback;
+        tape_level_callback = callback;
+        return old_callback;
+    }
+
+    void enable_screen_rendering(bool enable) {
+        screen_rendering_enabled = enable;
+    }
+
+    keyboard_state_type &get_keyboard_state() {
+        return keyboard_state;
+    }
+
+    void set_tape_edges(bool level, const int *edges,
+                        std::size_t num_of_edges, ticks_type end_tick) {
+        tape_level = level;
+        tape_edges.assign(edges, edges + num_of_edges);
+        tape_edges_end_tick = end_tick;
+        tape_edge_index = 0;
+    }
+
+    void set_playback_samples(const least_u8 *samples, std::size_t size) {
+        playback_samples.assign(samples, samples + size);
+        playback_sample_index = 0;
+        playback_enabled = true;
+    }
+
+    void disable_playback() {
+        playback_samples.clear();
+        playback_sample_index = 0;
+        playback_enabled = false;
+    }
+
+    std::size_t get_num_of_used_playback_samples() const {
+        return playback_sample_index;
+    }
+
 protected:
     Spectrum48::processor_state get_processor_state() {
         Spectrum48::processor_state state;
@@ -200,35 +255,125 @@ public:
 
     fast_u8 on_input(fast_u16 addr) {
         const fast_u8 default_value = 0xbf;
-        if(!on_input_callback)
-            return default_value;
 
-        PyObject *arg = Py_BuildValue("(i)", addr);
-        decref_guard arg_guard(arg);
+        // Once the samples of the frame are all used, let the
+        // callback handle the read.
+        if(playback_enabled) {
+            std::size_t i = playback_sample_index;
+            if(i != playback_samples.size()) {
+                playback_sample_index = i + 1;
+                return playback_samples[i];
+            }
+        }
 
-        retrieve_state();
-        PyObject *result = PyObject_CallObject(on_input_callback, arg);
-        decref_guard result_guard(result);
-        install_state();
+        if(on_input_callback) {
+            PyObject *arg = Py_BuildValue("(i)", addr);
+            decref_guard arg_guard(arg);
+
+            PyObject *result = call_python(on_input_callback, arg);
+            decref_guard result_guard(result);
+            if(!result) {
+                stop();
+                return default_value;
+            }
+
+            if(!PyLong_Check(result)) {
+                PyErr_SetString(PyExc_TypeError,
+                                "returning value must be integer");
+                stop();
+                return default_value;
+            }
+
+            return z80::mask8(PyLong_AsUnsignedLong(result));
+        }
 
-        if(!result) {
-            stop();
-            return default_value;
+        // Scan keyboard.
+        fast_u8 n = default_value;
+        for(unsigned i = 0; i != num_of_keyboard_ports; ++i) {
+            if(!(addr & (1u << (i + 8))))
+                n &= keyboard_state[i];
         }
 
-        if(!PyLong_Check(result)) {
-            PyErr_SetString(PyExc_TypeError, "returning value must be integer");
-            stop();
-            return default_value;
+        // TODO: Use the tick when the ear value is sampled
+        //       instead of the tick of the beginning of the input
+        //       cycle.
+        if(tape_level_callback) {
+            int level = get_tape_level();
+            if(level < 0) {
+                stop();
+                return n;
+            }
+
+            if(level)
+                n |= 0x40;
         }
 
-        return z80::mask8(PyLong_AsUnsignedLong(result));
+        return n;
+    }
+
+    // Returns -1 on errors.
+    int get_tape_level() {
+        // Look up the level in the table of edges, if it covers
+        // the current tick.
+        if(ticks_since_int <= tape_edges_end_tick) {
+            // Ports are normally read at increasing ticks, so we
+            // just move on along the edges. Only search for the
+            // edge if the tick goes back.
+            std::size_t i = tape_edge_index;
+            if(i > 0 && tape_edges[i - 1] > ticks_since_int) {
+                i = static_cast<std::size_t>(
+                    std::upper_bound(tape_edges.begin(), tape_edges.end(),
+                                     ticks_since_int) - tape_edges.begin());
+            } else {
+                std::size_t num_of_edges = tape_edges.size();
+                while(i != num_of_edges && tape_edges[i] <= ticks_since_int)
+                    ++i;
+            }
+            tape_edge_index = i;
+
+            bool odd = i % 2 != 0;
+            return tape_level != odd ? 1 : 0;
+        }
+
+        PyObject *result = call_python(tape_level_callback, nullptr);
+        decref_guard result_guard(result);
+        return result ? PyObject_IsTrue(result) : -1;
+    }
+
+protected:
+    PyObject *call_python(PyObject *callback, PyObject *args) {
+        // The callback may replace itself while running.
+        Py_INCREF(callback);
+        decref_guard callback_guard(callback);
+
+        retrieve_state();
+        PyObject *result = PyObject_CallObject(callback, args);
+        install_state();
+        return result;
     }
 
 private:
     machine_state state;
     pixels_buffer_type pixels;
+    rgb565_pixels_buffer_type rgb565_pixels;
+    keyboard_state_type keyboard_state = {0xff, 0xff, 0xff, 0xff,
+                                          0xff, 0xff, 0xff, 0xff};
     PyObject *on_input_callback = nullptr;
+    PyObject *tape_level_callback = nullptr;
+
+    // The level at the beginning of the frame and the ticks at
+    // which it flips.
+    bool tape_level = false;
+    std::vector<ticks_type> tape_edges;
+    ticks_type tape_edges_end_tick = 0;
+
+    // The number of edges before the tick of the last read.
+    std::size_t tape_edge_index = 0;
+
+    // Input samples of the current playback frame.
+    bool playback_enabled = false;
+    std::vector<least_u8> playback_samples;
+    std::size_t playback_sample_index = 0;
 };
 
 struct object_instance {
@@ -266,6 +411,12 @@ static PyObject *get_frame_pixels(PyObject *self, PyObject *args) {
                                    sizeof(pixels), PyBUF_READ);
 }
 
+static PyObject *get_frame_rgb565_pixels(PyObject *self, PyObject *args) {
+    auto &pixels = cast_emulator(self).get_frame_rgb565_pixels();
+    return PyMemoryView_FromMemory(reinterpret_cast<char*>(pixels),
+                                   sizeof(pixels), PyBUF_WRITE);
+}
+
 static PyObject *mark_addrs(PyObject *self, PyObject *args) {
     unsigned addr, size, marks;
     if(!PyArg_ParseTuple(args, "III", &addr, &size, &marks))
@@ -275,16 +426,45 @@ static PyObject *mark_addrs(PyObject *self, PyObject *args) {
     Py_RETURN_NONE;
 }
 
-static PyObject *set_on_input_callback(PyObject *self, PyObject *args) {
+static PyObject *enable_screen_rendering(PyObject *self, PyObject *args) {
+    int enable;
+    if(!PyArg_ParseTuple(args, "p:enable_screen_rendering", &enable))
+        return nullptr;
+
+    cast_emulator(self).enable_screen_rendering(enable);
+    Py_RETURN_NONE;
+}
+
+static PyObject *get_memory_marks_view(PyObject *self, PyObject *args) {
+    auto &memory_marks = cast_emulator(self).get_memory_marks();
+    return PyMemoryView_FromMemory(reinterpret_cast<char*>(memory_marks),
+                                   sizeof(memory_marks), PyBUF_WRITE);
+}
+
+static bool parse_callback(PyObject *args, PyObject **callback) {
     PyObject *new_callback;
     if(!PyArg_ParseTuple(args, "O:set_callback", &new_callback))
-        return nullptr;
+        return false;
+
+    if(new_callback == Py_None) {
+        *callback = nullptr;
+        return true;
+    }
 
     if(!PyCallable_Check(new_callback)) {
-        PyErr_SetString(PyExc_TypeError, "parameter must be callable");
-        return nullptr;
+        PyErr_SetString(PyExc_TypeError, "parameter must be callable or None");
+        return false;
     }
 
+    *callback = new_callback;
+    return true;
+}
+
+static PyObject *set_on_input_callback(PyObject *self, PyObject *args) {
+    PyObject *new_callback;
+    if(!parse_callback(args, &new_callback))
+        return nullptr;
+
     auto &emulator = cast_emulator(self);
     PyObject *old_callback = emulator.set_on_input_callback(new_callback);
     Py_XINCREF(new_callback);
@@ -292,6 +472,84 @@ static PyObject *set_on_input_callback(PyObject *self, PyObject *args) {
     Py_RETURN_NONE;
 }
 
+static PyObject *set_tape_level_callback(PyObject *self, PyObject *args) {
+    PyObject *new_callback;
+    if(!parse_callback(args, &new_callback))
+        return nullptr;
+
+    auto &emulator = cast_emulator(self);
+    PyObject *old_callback = emulator.set_tape_level_callback(new_callback);
+    Py_XINCREF(new_callback);
+    Py_XDECREF(old_callback);
+    Py_RETURN_NONE;
+}
+
+static PyObject *set_tape_edges(PyObject *self, PyObject *args) {
+    int level;
+    PyObject *edges;
+    unsigned end_tick;
+    if(!PyArg_ParseTuple(args, "pOI:set_tape_edges", &level, &edges,
+                         &end_tick))
+        return nullptr;
+
+    Py_buffer view;
+    if(PyObject_GetBuffer(edges, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+        return nullptr;
+
+    bool is_int_array = view.itemsize == sizeof(int) && view.format &&
+                        std::strcmp(view.format, "i") == 0;
+    if(is_int_array) {
+        auto &emulator = cast_emulator(self);
+        emulator.set_tape_edges(level, static_cast<const int*>(view.buf),
+                                static_cast<std::size_t>(view.len) /
+                                    sizeof(int),
+                                end_tick);
+    }
+
+    PyBuffer_Release(&view);
+
+    if(!is_int_array) {
+        PyErr_SetString(PyExc_TypeError, "edges must be an array of ints");
+        return nullptr;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *set_playback_samples(PyObject *self, PyObject *args) {
+    PyObject *samples;
+    if(!PyArg_ParseTuple(args, "O:set_playback_samples", &samples))
+        return nullptr;
+
+    auto &emulator = cast_emulator(self);
+    if(samples == Py_None) {
+        emulator.disable_playback();
+        Py_RETURN_NONE;
+    }
+
+    Py_buffer view;
+    if(PyObject_GetBuffer(samples, &view, PyBUF_C_CONTIGUOUS) < 0)
+        return nullptr;
+
+    emulator.set_playback_samples(static_cast<const least_u8*>(view.buf),
+                                  static_cast<std::size_t>(view.len));
+
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
+
+static PyObject *get_num_of_used_playback_samples(PyObject *self,
+                                                  PyObject *args) {
+    auto &emulator = cast_emulator(self);
+    return PyLong_FromSize_t(emulator.get_num_of_used_playback_samples());
+}
+
+static PyObject *get_keyboard_state_view(PyObject *self, PyObject *args) {
+    auto &keyboard_state = cast_emulator(self).get_keyboard_state();
+    return PyMemoryView_FromMemory(reinterpret_cast<char*>(keyboard_state),
+                                   sizeof(keyboard_state), PyBUF_WRITE);
+}
+
 PyObject *run(PyObject *self, PyObject *args) {
     auto &emulator = cast_emulator(self);
     events_mask events = emulator.run();
@@ -313,13 +571,45 @@ PyMethodDef methods[] = {
      "Render current screen frame and return a MemoryView object that exposes "
      "a buffer that contains rendered data."},
     {"get_frame_pixels", get_frame_pixels, METH_NOARGS,
-     "Convert rendered frame into an internally allocated array of RGB24 pixels "
-     "and return a MemoryView object that exposes that array."},
+     "Render the rest of current screen frame, convert it into an internally "
+     "allocated array of RGB24 pixels and return a MemoryView object that "
+     "exposes that array. The array is the same for all frames. The "
+     "MemoryView does not keep the emulator alive and is only valid for "
+     "the emulator's lifetime."},
+    {"_get_frame_rgb565_pixels", get_frame_rgb565_pixels, METH_NOARGS,
+     "Same as get_frame_pixels(), but for a separate writable array of "
+     "native-endian RGB565 pixels."},
     {"mark_addrs", mark_addrs, METH_VARARGS,
      "Mark a range of memory bytes as ones that require custom "
      "processing on reading, writing or executing them."},
+    {"enable_screen_rendering", enable_screen_rendering, METH_VARARGS,
+     "Enable or disable rendering the screen as the machine runs. "
+     "Frames are not updated while rendering is disabled."},
+    {"_get_memory_marks_view", get_memory_marks_view, METH_NOARGS,
+     "Return a MemoryView object that exposes the marks of memory "
+     "bytes."},
     {"set_on_input_callback", set_on_input_callback, METH_VARARGS,
-     "Set a callback function handling reading from ports."},
+     "Set a callback function handling reading from ports. If None, the "
+     "ports are read from the internal keyboard state and the tape level "
+     "callback."},
+    {"set_tape_level_callback", set_tape_level_callback, METH_VARARGS,
+     "Set a callback function returning the current tape level. If None, "
+     "the tape level is considered low."},
+    {"set_tape_edges", set_tape_edges, METH_VARARGS,
+     "Set the tape level at the beginning of the current frame, an array "
+     "of ticks at which the level flips and the last tick the array "
+     "covers. Levels at later ticks are requested with the tape level "
+     "callback."},
+    {"set_playback_samples", set_playback_samples, METH_VARARGS,
+     "Set the input samples of the current playback frame. Ports are "
+     "read from these samples till they are all used, and then from "
+     "the input callback. If None, playback samples are not used."},
+    {"get_num_of_used_playback_samples", get_num_of_used_playback_samples,
+     METH_NOARGS,
+     "Return the number of playback samples read in the current frame."},
+    {"_get_keyboard_state_view", get_keyboard_state_view, METH_NOARGS,
+     "Return a MemoryView object that exposes the internal states of the "
+     "eight keyboard half-rows."},
     {"run", run, METH_NOARGS,
      "Run emulator until one or several events are signaled."},
     {"on_handle_active_int", on_handle_active_int, METH_NOARGS,
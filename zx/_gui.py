@@ -11,6 +11,7 @@
 import cairo
 import enum
 import gi
+import time
 from ._device import Device
 from ._device import GetEmulationPauseState
 from ._device import GetEmulationTime
@@ -25,6 +26,7 @@ from ._device import ScreenUpdated
 from ._device import TapeStateUpdated
 from ._device import ToggleEmulationPause
 from ._device import ToggleTapePause
+from ._device import WaitUntil
 from ._error import USER_ERRORS
 from ._error import verbalize_error
 from ._except import EmulationExit
@@ -32,7 +34,7 @@ from ._time import get_elapsed_time
 from ._time import get_timestamp
 from ._utils import div_ceil
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk  # nopep8
+from gi.repository import Gtk, Gdk, GLib  # nopep8
 
 
 SCREENCAST = False
@@ -128,6 +130,9 @@ class Notification(object):
         self._timestamp = None
         self._draw = None
 
+    def is_shown(self):
+        return self._timestamp is not None
+
     def draw(self, window_size, screen_size, context):
         if not self._timestamp:
             return
@@ -165,7 +170,8 @@ class Screencast(object):
 
 
 class _KeyEvent(object):
-    def __init__(self, id, pressed):
+    def __init__(self, handler, id, pressed):
+        self.handler = handler
         self.id = id
         self.pressed = pressed
 
@@ -188,6 +194,11 @@ class _ExceptionEvent(object):
 class ScreenWindow(Device):
     _SCREEN_AREA_BACKGROUND_COLOUR = rgb('#1e1e1e')
 
+    # Quanta can be as short as a single instruction, e.g., when
+    # profiling, and there can be hundreds of frames per second
+    # on full throttle, so we only get back to GTK this often.
+    _GTK_ITERATION_INTERVAL = 0.01
+
     _GTK_KEYS_TO_ZX_KEYS = {
         'RETURN': 'ENTER',
         'ALT_L': 'CAPS SHIFT',
@@ -199,6 +210,12 @@ class ScreenWindow(Device):
         super().__init__()
 
         self.__events = []
+        self.__next_gtk_iteration = 0
+        self.__waiting = False
+
+        # Handlers and ZX key ids by GDK keyvals, so we only
+        # translate every key once.
+        self.__keys = {}
 
         self._window = Gtk.Window()
 
@@ -221,6 +238,7 @@ class ScreenWindow(Device):
             QuantumRun: self._on_quantum_run,
             ScreenUpdated: self._on_updated_screen,
             TapeStateUpdated: self._on_updated_tape_state,
+            WaitUntil: self.__on_wait_until,
         }
 
         self._notification = Notification()
@@ -251,21 +269,26 @@ class ScreenWindow(Device):
         self._window.show_all()
 
         self.frame_size = self.frame_width * self.frame_height
-        self.frame = cairo.ImageSurface(cairo.FORMAT_RGB24,
-                                        self.frame_width, self.frame_height)
-        self.frame_data = self.frame.get_data()
 
-        self.pattern = cairo.SurfacePattern(self.frame)
-        if not SCREENCAST:
-            self.pattern.set_filter(cairo.FILTER_NEAREST)
+        # The frame surface is created on the first screen update
+        # so it can share the pixel buffer with the emulator.
+        self.frame = None
+        self.pattern = None
+        self.__screen = None
+        self.__machine = None
+        self.__screen_rect = None
+        self.__frame_updated = False
 
         self._window.connect('key-press-event', self.__on_gdk_key)
         self._window.connect('key-release-event', self.__on_gdk_key)
         self._window.connect('button-press-event', self.__on_gdk_click)
         self._window.connect('window-state-event',
                              self.__on_window_state_event)
+        self._window.connect('configure-event', self.__on_configure_event)
 
-    def _on_draw_area(self, widget, context):
+    # The layout only changes with the size of the window, so
+    # there is no need to recompute it on every redraw.
+    def __update_layout(self):
         window_size = self._window.get_size()
         window_width, window_height = window_size
         width = min(window_width,
@@ -275,29 +298,113 @@ class ScreenWindow(Device):
                      div_ceil(window_width * self.frame_height,
                               self.frame_width))
 
-        # Draw the background.
-        context.save()
-        context.rectangle(0, 0, window_width, window_height)
-        context.set_source_rgba(*self._SCREEN_AREA_BACKGROUND_COLOUR)
-        context.fill()
+        # Stick to whole scales when the window is large enough.
+        # Every emulated pixel then takes the same number of
+        # window pixels and scaling is a plain replication.
+        if not SCREENCAST:
+            scale = min(window_width // self.frame_width,
+                        window_height // self.frame_height)
+            if scale:
+                width = self.frame_width * scale
+                height = self.frame_height * scale
+
+        # Remember where the screen is, so that updates only
+        # invalidate that area.
+        x = (window_width - width) // 2
+        y = (window_height - height) // 2
+
+        self.__window_size = window_size
+        self.__screen_rect = x, y, width, height
+        self.__update_pattern_matrix()
+
+    # Place the screen with the pattern's own matrix, so drawing
+    # it does not need to transform and then restore the context.
+    def __update_pattern_matrix(self):
+        if not self.pattern or not self.__screen_rect:
+            return
+
+        x, y, width, height = self.__screen_rect
+        matrix = cairo.Matrix()
+        matrix.scale(self.frame_width / width, self.frame_height / height)
+        matrix.translate(-x, -y)
+        self.pattern.set_matrix(matrix)
+
+    def __on_configure_event(self, widget, event):
+        self.__update_layout()
+
+    def _on_draw_area(self, widget, context):
+        if not self.__screen_rect:
+            self.__update_layout()
+
+        x, y, width, height = self.__screen_rect
+
+        # Draw the background, unless we only redraw the
+        # screen.
+        x1, y1, x2, y2 = context.clip_extents()
+        if x1 < x or y1 < y or x2 > x + width or y2 > y + height:
+            context.set_source_rgba(*self._SCREEN_AREA_BACKGROUND_COLOUR)
+            context.paint()
 
         # Draw the emulated screen.
-        context.save()
-        context.translate((window_width - width) // 2,
-                          (window_height - height) // 2)
-        context.scale(width / self.frame_width, height / self.frame_height)
-        context.set_source(self.pattern)
-        context.paint()
-        context.restore()
+        if self.pattern:
+            context.rectangle(x, y, width, height)
+            context.set_source(self.pattern)
+            context.fill()
 
-        self._notification.draw(window_size, (width, height), context)
-        context.restore()
+        self._notification.draw(self.__window_size, (width, height),
+                                context)
 
         self._screencast.on_draw(context.get_group_target())
 
+    def __create_frame(self, machine, pixels):
+        # The emulator renders frames into the same persistent
+        # buffer of native-endian RGB565 pixels, so we can paint
+        # directly from it without copying pixels every frame.
+        # The buffer is owned by the machine, which we therefore
+        # keep alive for as long as the surface.
+        self.__machine = machine
+        stride = cairo.ImageSurface.format_stride_for_width(
+            cairo.FORMAT_RGB16_565, self.frame_width)
+        assert stride * self.frame_height == len(pixels)
+        self.frame = cairo.ImageSurface.create_for_data(
+            pixels, cairo.FORMAT_RGB16_565,
+            self.frame_width, self.frame_height, stride)
+
+        # Paint from a surface of the same kind as the window's
+        # one, so that the backend can scale it on its side
+        # instead of uploading the whole image on every redraw.
+        window = self.area.get_window()
+        if window:
+            self.__screen = window.create_similar_surface(
+                cairo.CONTENT_COLOR, self.frame_width, self.frame_height)
+        else:
+            self.__screen = self.frame
+
+        self.pattern = cairo.SurfacePattern(self.__screen)
+        if not SCREENCAST:
+            self.pattern.set_filter(cairo.FILTER_NEAREST)
+        self.__update_pattern_matrix()
+
     def _on_updated_screen(self, event, devices):
-        self.frame_data[:] = event.pixels
-        self.area.queue_draw()
+        # Have the frame converted into the buffer the surface
+        # paints from.
+        pixels = event.machine._get_frame_rgb565_pixels()
+        if self.frame is None:
+            self.__create_frame(event.machine, pixels)
+
+        # Frames may come faster than we can show them, so only
+        # the latest one is uploaded and drawn.
+        self.__frame_updated = True
+
+    def __upload_frame(self):
+        self.frame.mark_dirty()
+
+        # Upload the new frame once.
+        if self.__screen is not self.frame:
+            context = cairo.Context(self.__screen)
+            context.set_operator(cairo.OPERATOR_SOURCE)
+            context.set_source_surface(self.frame)
+            context.paint()
 
     def _show_help(self, devices):
         KEYS_HELP = [
@@ -369,19 +476,36 @@ class ScreenWindow(Device):
     def __queue_event(self, event):
         self.__events.append(event)
 
+    def __translate_keyval(self, keyval):
+        # TODO: Do not upper the case here.
+        name = Gdk.keyval_name(keyval)
+        if name is None:
+            return None
+
+        id = name.upper()
+        return (self._KEY_HANDLERS.get(id),
+                self._GTK_KEYS_TO_ZX_KEYS.get(id, id))
+
     def __on_gdk_key(self, widget, event):
-        # TODO: Do not upper the case here. Ignore unknown key.
-        # Translate to our own key ids.
+        keyval = event.keyval
+        try:
+            key = self.__keys[keyval]
+        except KeyError:
+            key = self.__keys[keyval] = self.__translate_keyval(keyval)
+
+        # Ignore unknown keys.
+        if key is None:
+            return
+
+        handler, id = key
         self.__queue_event(_KeyEvent(
-            Gdk.keyval_name(event.keyval).upper(),
-            event.type == Gdk.EventType.KEY_PRESS))
+            handler, id, event.type == Gdk.EventType.KEY_PRESS))
 
     def __on_key(self, event, devices):
-        if event.pressed and event.id in self._KEY_HANDLERS:
-            self._KEY_HANDLERS[event.id](devices)
+        if event.pressed and event.handler:
+            event.handler(devices)
 
-        zx_key_id = self._GTK_KEYS_TO_ZX_KEYS.get(event.id, event.id)
-        devices.notify(KeyStroke(zx_key_id, event.pressed))
+        devices.notify(KeyStroke(event.id, event.pressed))
 
     def __on_gdk_click(self, widget, event):
         TYPES = {
@@ -412,10 +536,13 @@ class ScreenWindow(Device):
         state = event.new_window_state
         self._is_fullscreen = bool(state & Gdk.WindowState.FULLSCREEN)
 
+    def get_event_types(self):
+        return tuple(self._EVENT_HANDLERS)
+
     def on_event(self, event, devices, result):
         event_type = type(event)
         if event_type in self._EVENT_HANDLERS:
-            self._EVENT_HANDLERS[event_type](event, devices)
+            return self._EVENT_HANDLERS[event_type](event, devices) or result
         return result
 
     def _on_updated_pause_state(self, event, devices):
@@ -432,15 +559,57 @@ class ScreenWindow(Device):
         tape_time = devices.notify(GetTapePlayerTime())
         self._notification.set(draw, tape_time)
 
-    def _on_quantum_run(self, event, devices):
-        self.area.queue_draw()
-
-        while Gtk.events_pending():
-            Gtk.main_iteration()
+    # The background never changes and resizing redraws the
+    # whole window anyway, so only invalidate the screen area.
+    def __queue_screen_draw(self):
+        if self.__screen_rect:
+            self.area.queue_draw_area(*self.__screen_rect)
+        else:
+            self.area.queue_draw()
 
+    def _on_quantum_run(self, event, devices):
+        now = time.monotonic()
+        if now >= self.__next_gtk_iteration:
+            self.__next_gtk_iteration = now + self._GTK_ITERATION_INTERVAL
+
+            # Redraw once per iteration at most, and only if there
+            # is a new frame or a notification to animate.
+            if self.__frame_updated:
+                self.__frame_updated = False
+                self.__upload_frame()
+                self.__queue_screen_draw()
+            elif self._notification.is_shown():
+                self.__queue_screen_draw()
+
+            # Dispatch whatever is ready without polling for more.
+            # Anything left is handled on the next quantum.
+            Gtk.main_iteration_do(False)
+
+        # Events queued while waiting for the next frame are
+        # handled here as well.
         while self.__events:
             self.on_event(self.__events.pop(0), devices, None)
 
+    def __on_wait_end(self):
+        self.__waiting = False
+        return False
+
+    # Instead of sleeping, keep the GTK main loop running till the
+    # deadline, so user input and redraws are not held back by
+    # frame pacing. The events are only queued here and handled on
+    # the next quantum.
+    def __on_wait_until(self, event, devices):
+        timeout = event.deadline - time.monotonic()
+        if timeout <= 0:
+            return True
+
+        self.__waiting = True
+        GLib.timeout_add(int(timeout * 1000) or 1, self.__on_wait_end)
+        while self.__waiting:
+            Gtk.main_iteration_do(True)
+
+        return True
+
     def __toggle_pause(self, devices):
         devices.notify(ToggleEmulationPause())
 
@@ -448,5 +617,14 @@ class ScreenWindow(Device):
         devices.notify(ToggleTapePause())
 
     def destroy(self):
+        # The frame surface paints directly from the memory of
+        # the machine, so release it along with the machine.
+        if self.frame is not None:
+            self.frame.finish()
+        self.frame = None
+        self.pattern = None
+        self.__screen = None
+        self.__machine = None
+
         self._window.destroy()
         super().destroy()
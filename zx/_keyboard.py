@@ -30,6 +30,11 @@ class Key(object):
             self.ADDRESS_LINE = halfrow_index // 2 + 12
             self.PORT_BIT = 4 - index_in_halfrow
 
+        # The index of the keyboard state byte and the bit of
+        # the key in it.
+        self.HALFROW = self.ADDRESS_LINE - 8
+        self.MASK = 1 << self.PORT_BIT
+
 
 _KEY_IDS = [
     '1', '2', '3', '4', '5', '6', '7', '8', '9', '0',
@@ -47,41 +52,54 @@ for index, ids in enumerate(_KEY_IDS):
         KEYS[i] = info
 
 
+# Indexes of half-rows selected by each value of the high byte of
+# port address. Half-rows are selected with zeros on address lines
+# A8..A15.
+_SELECTED_HALFROWS = tuple(
+    tuple(i for i in range(8) if not hi & (1 << i))
+    for hi in range(0x100))
+
+
 class Keyboard(Device):
-    _state = [0xff] * 8
+    def __init__(self, state=None):
+        # The state of half-rows may be shared with the machine.
+        if state is None:
+            state = bytearray(b'\xff' * 8)
+        self._state = state
+
+        # Port values by the high byte of the address. Keys
+        # change far less often than ports are read, so we only
+        # rebuild the table when the state changes.
+        self.__port_values = None
+
+    def __get_port_values(self):
+        state = self._state
+        port_values = bytearray(0x100)
+        for hi, halfrows in enumerate(_SELECTED_HALFROWS):
+            n = 0xff
+            for i in halfrows:
+                n &= state[i]
+            port_values[hi] = n
+        return port_values
 
     def read_port(self, addr):
-        n = 0xff
-        addr ^= 0xffff
-
-        if addr & (1 << 8):
-            n &= self._state[0]
-        if addr & (1 << 9):
-            n &= self._state[1]
-        if addr & (1 << 10):
-            n &= self._state[2]
-        if addr & (1 << 11):
-            n &= self._state[3]
-        if addr & (1 << 12):
-            n &= self._state[4]
-        if addr & (1 << 13):
-            n &= self._state[5]
-        if addr & (1 << 14):
-            n &= self._state[6]
-        if addr & (1 << 15):
-            n &= self._state[7]
-
-        return n
+        port_values = self.__port_values
+        if port_values is None:
+            port_values = self.__port_values = self.__get_port_values()
+        return port_values[addr >> 8]
 
     def handle_key_stroke(self, key_info, pressed):
         # print(key_info.id)
-        addr_line = key_info.ADDRESS_LINE
-        mask = 1 << key_info.PORT_BIT
-
+        halfrow = key_info.HALFROW
         if pressed:
-            self._state[addr_line - 8] &= mask ^ 0xff
+            self._state[halfrow] &= key_info.MASK ^ 0xff
         else:
-            self._state[addr_line - 8] |= mask
+            self._state[halfrow] |= key_info.MASK
+
+        self.__port_values = None
+
+    def get_event_types(self):
+        return KeyStroke, ReadPort
 
     def on_event(self, event, devices, result):
         if isinstance(event, KeyStroke):
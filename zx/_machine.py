@@ -10,6 +10,7 @@
 
 
 import enum
+import re
 from ._data import MachineSnapshot
 from ._data import ProcessorSnapshot
 from ._device import GetEmulationPauseState
@@ -386,16 +387,35 @@ class Dispatcher(object):
 
         self.__devices = list(devices)
 
+        # Devices to notify, by event type.
+        self.__devices_by_event_type = dict()
+
     def __iter__(self):
         yield from self.__devices
 
     # TODO: Since this now can return values, it needs a
     # different name.
     def notify(self, event, result=None):
-        for device in self:
+        event_type = type(event)
+        devices = self.__devices_by_event_type.get(event_type)
+        if devices is None:
+            devices = self.__get_devices_to_notify(event_type)
+            self.__devices_by_event_type[event_type] = devices
+
+        for device in devices:
             result = device.on_event(event, self, result)
         return result
 
+    def __get_devices_to_notify(self, event_type):
+        devices = []
+        for device in self.__devices:
+            # Custom devices do not have to be derived from Device.
+            get_event_types = getattr(device, 'get_event_types', None)
+            event_types = get_event_types() if get_event_types else None
+            if event_types is None or issubclass(event_type, event_types):
+                devices.append(device)
+        return tuple(devices)
+
     # TODO: Do that with events?
     def destroy(self):
         for device in self:
@@ -406,15 +426,30 @@ class Spectrum48(_Spectrum48Base, MachineState):
     # Memory marks.
     __NO_MARKS = 0
     __BREAKPOINT_MARK = 1 << 0
+    __VISITED_INSTR_MARK = 1 << 7
+
+    # Matches bytes marked with __VISITED_INSTR_MARK.
+    __VISITED_INSTR_MARKS = re.compile(b'[\x80-\xff]')
 
     def __init__(self):
         MachineState.__init__(self, self._get_state_view())
+        self.__memory_marks = self._get_memory_marks_view()
 
         # Install ROM.
         self.write(0x0000, load_rom_image('Spectrum48.rom'))
 
         self.__paused = False
 
+        self.__event_handlers = {
+            GetEmulationPauseState: self.__on_get_pause_state,
+            GetEmulationTime: self.__on_get_emulation_time,
+            KeyStroke: self.__on_key_stroke,
+            LoadFile: self.__on_load_file,
+            SaveSnapshot: self.__on_save_snapshot,
+            ToggleEmulationPause: self.__on_toggle_pause,
+            ToggleTapePause: self.__on_toggle_tape_pause,
+        }
+
     def destroy(self):
         devices = self.devices
         self.devices = None
@@ -446,25 +481,61 @@ class Spectrum48(_Spectrum48Base, MachineState):
     def set_breakpoint(self, addr):
         self.set_breakpoints(addr, 1)
 
+    def get_visited_instr_addrs(self):
+        for match in self.__VISITED_INSTR_MARKS.finditer(self.__memory_marks):
+            yield match.start()
+
     def on_breakpoint(self):
         raise EmulatorException('Breakpoint triggered.')
 
+    def __on_get_pause_state(self, event, result):
+        return self.paused
+
+    def __on_get_emulation_time(self, event, result):
+        return self._emulation_time
+
+    def __on_key_stroke(self, event, result):
+        key = KEYS.get(event.id, None)
+        if key:
+            self.paused = False
+            self._quit_playback_mode()
+        return result
+
+    def __on_load_file(self, event, result):
+        self._load_file(event.filename)
+        return result
+
+    def __on_save_snapshot(self, event, result):
+        self._save_snapshot_file(Z80SnapshotFormat, event.filename)
+        return result
+
+    def __on_toggle_pause(self, event, result):
+        self.paused ^= True
+        return result
+
+    def __on_toggle_tape_pause(self, event, result):
+        self._toggle_tape_pause()
+        return result
+
+    def get_event_types(self):
+        return tuple(self.__event_handlers)
+
+    # The dispatcher also sends us subclasses of the handled
+    # events, so look them up along the MRO and remember what we
+    # have found.
+    def __find_event_handler(self, event_type):
+        for base in event_type.__mro__:
+            handler = self.__event_handlers.get(base)
+            if handler:
+                self.__event_handlers[event_type] = handler
+                return handler
+        return None
+
     def on_event(self, event, devices, result):
-        if isinstance(event, GetEmulationPauseState):
-            return self.paused
-        elif isinstance(event, GetEmulationTime):
-            return self._emulation_time
-        elif isinstance(event, KeyStroke):
-            key = KEYS.get(event.id, None)
-            if key:
-                self.paused = False
-                self._quit_playback_mode()
-        elif isinstance(event, LoadFile):
-            self._load_file(event.filename)
-        elif isinstance(event, SaveSnapshot):
-            self._save_snapshot_file(Z80SnapshotFormat, event.filename)
-        elif isinstance(event, ToggleEmulationPause):
-            self.paused ^= True
-        elif isinstance(event, ToggleTapePause):
-            self._toggle_tape_pause()
+        event_type = type(event)
+        handler = self.__event_handlers.get(event_type)
+        if not handler:
+            handler = self.__find_event_handler(event_type)
+        if handler:
+            return handler(event, result)
         return result
@@ -29,14 +29,18 @@ from ._rzx import RZXFile
 
 # Stores information about the running code.
 class Profile(object):
-    _annots = dict()
+    def __init__(self):
+        # Instructions are the only kind of annotations we
+        # collect, so just mark their addresses.
+        self._instrs = bytearray(0x10000)
 
     def add_instr_addr(self, addr):
-        self._annots[addr] = 'instr'
+        self._instrs[addr] = 1
 
     def __iter__(self):
-        for addr in sorted(self._annots):
-            yield addr, self._annots[addr]
+        for addr, is_instr in enumerate(self._instrs):
+            if is_instr:
+                yield addr, 'instr'
 
 
 def pop_argument(args, error):
@@ -131,7 +135,7 @@ def test_file(filename):
         os.rename(filename, dest_path)
         print('%r moved to %r' % (filename, dest_dir))
 
-    with Emulator(speed_factor=None) as app:
+    with Emulator(speed_factor=None, screen_rendering=False) as app:
         try:
             app._run_file(filename)
             move('passed')
@@ -161,7 +165,7 @@ def _convert_tape_to_snapshot(src, src_filename, src_format,
     assert issubclass(src_format, SoundFileFormat), src_format
     assert issubclass(dest_format, SnapshotFormat), dest_format
 
-    with Emulator(speed_factor=None) as app:
+    with Emulator(speed_factor=None, screen_rendering=False) as app:
         app.load_tape(src_filename)
         app._save_snapshot_file(dest_format, dest_filename)
 
@@ -179,7 +183,7 @@ def _convert_snapshot_to_snapshot(src, src_filename, src_format,
     assert issubclass(src_format, SnapshotFormat), src_format
     assert issubclass(dest_format, SnapshotFormat), dest_format
 
-    with Emulator(speed_factor=None) as app:
+    with Emulator(speed_factor=None, screen_rendering=False) as app:
         app._load_file(src_filename)
         app._save_snapshot_file(dest_format, dest_filename)
 
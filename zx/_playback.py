@@ -20,63 +20,103 @@ class PlaybackPlayer(object):
         assert isinstance(file, RZXFile)
         self._recording = file
 
-        self.samples = self.__get_playback_samples()
+        self.__flatten_frames()
+        self.__info_chunk = self.__find_info_chunk()
 
-    def find_recording_info_chunk(self):
+        self.playback_frame_count = -1
+        self.playback_chunk = None
+        self.__frame_i = 0
+        self.__frame_begin = 0
+        self.__frame_end = 0
+        self.__sample_i = 0
+
+    def __find_info_chunk(self):
         for chunk in self._recording['chunks']:
             if chunk['id'] == 'info':
                 return chunk
         assert 0  # TODO
 
+    def find_recording_info_chunk(self):
+        return self.__info_chunk
+
     def get_chunks(self):
         return self._recording['chunks']
 
-    def __get_playback_samples(self):
-        # TODO: Have a class describing playback state.
-        self.playback_frame_count = 0
-        self.playback_chunk = 0
-        self.playback_sample_values = []
-        self.playback_sample_i = 0
+    def __flatten_frames(self):
+        # Input samples of all frames go one after another, so
+        # fetching a sample is just reading the next byte.
+        self.__samples = bytearray()
 
-        frame_count = 0
-        for chunk_i, chunk in enumerate(self.get_chunks()):
+        # The chunks to apply before each frame, the number of
+        # fetches in the frame and where its samples end.
+        self.__frames = []
+
+        chunks_to_apply = []
+        for chunk in self.get_chunks():
             if isinstance(chunk, MachineSnapshot):
-                self.__machine.install_snapshot(chunk)
+                chunks_to_apply.append(chunk)
                 continue
 
             if chunk['id'] != 'port_samples':
                 continue
 
-            self.__machine.ticks_since_int = chunk['first_tick']
-
-            for frame_i, frame in enumerate(chunk['frames']):
-                num_of_fetches, samples = frame
-                # print(num_of_fetches, samples)
+            chunks_to_apply.append(chunk)
+            for num_of_fetches, samples in chunk['frames']:
+                self.__samples.extend(samples)
+                self.__frames.append((chunks_to_apply, chunk, num_of_fetches,
+                                      len(self.__samples)))
+                chunks_to_apply = []
 
-                self.__machine.fetches_limit = num_of_fetches
-                # print(num_of_fetches, samples, flush=True)
+        self.__trailing_chunks = chunks_to_apply
 
-                # print('START_OF_FRAME', flush=True)
-                yield 'START_OF_FRAME'
-
-                for sample_i, sample in enumerate(samples):
-                    # print(self.fetches_limit)
-                    # fetch = num_of_fetches - self.fetches_limit
-                    # print('Input at fetch', fetch, 'of', num_of_fetches)
-                    # TODO: print('read_port 0x%04x 0x%02x' % (addr, n),
-                    #             flush=True)
-
-                    # TODO: Have a class describing playback state.
-                    self.playback_frame_count = frame_count
-                    self.playback_chunk = chunk
-                    self.playback_sample_values = samples
-                    self.playback_sample_i = sample_i
-                    # print(frame_count, chunk_i, frame_i, sample_i, sample,
-                    #       flush=True)
-
-                    yield sample
-
-                # print('END_OF_FRAME', flush=True)
-                yield 'END_OF_FRAME'
-
-                frame_count += 1
+    def __apply_chunks(self, chunks):
+        for chunk in chunks:
+            if isinstance(chunk, MachineSnapshot):
+                self.__machine.install_snapshot(chunk)
+            else:
+                self.__machine.ticks_since_int = chunk['first_tick']
+
+    # Returns False if there are no more frames to play.
+    def start_frame(self):
+        if self.__frame_i == len(self.__frames):
+            self.__apply_chunks(self.__trailing_chunks)
+            self.__trailing_chunks = []
+            return False
+
+        chunks, chunk, num_of_fetches, end = self.__frames[self.__frame_i]
+        self.__apply_chunks(chunks)
+        self.__machine.fetches_limit = num_of_fetches
+
+        self.playback_frame_count = self.__frame_i
+        self.playback_chunk = chunk
+        self.__frame_begin = self.__frame_end
+        self.__frame_end = end
+        self.__sample_i = self.__frame_begin
+
+        self.__frame_i += 1
+        return True
+
+    # Returns None if all samples of the frame are used.
+    def get_sample(self):
+        i = self.__sample_i
+        if i == self.__frame_end:
+            return None
+
+        self.__sample_i = i + 1
+        return self.__samples[i]
+
+    # For samples read bypassing get_sample().
+    def set_num_of_used_samples(self, n):
+        self.__sample_i = self.__frame_begin + n
+
+    def is_end_of_frame(self):
+        return self.__sample_i == self.__frame_end
+
+    @property
+    def playback_sample_values(self):
+        return self.__samples[self.__frame_begin:self.__frame_end]
+
+    # The index of the last used sample in the frame.
+    @property
+    def playback_sample_i(self):
+        return self.__sample_i - self.__frame_begin - 1
@@ -9,6 +9,7 @@
 #   Published under the MIT license.
 
 
+import io
 from ._binary import BinaryParser, BinaryWriter
 from ._data import Data
 from ._data import FileFormat
@@ -161,10 +162,12 @@ def _parse_rzx(image):
     return {'id': 'input_recording', 'chunks': chunks}
 
 
-def make_rzx(recording):
+# Writes the recording to a stream chunk by chunk, so that long
+# recordings are never encoded in memory as a whole.
+def write_rzx(recording, stream):
     assert recording['id'] == 'input_recording'
 
-    writer = BinaryWriter()
+    writer = BinaryWriter(stream)
     signature = b'RZX!'
     major_revision = b'\x00'
     minor_revision = b'\x0c'
@@ -190,30 +193,39 @@ def make_rzx(recording):
                                uncompressed_length=len(image))
             chunk_writer.write_block(image)
         elif id == 'port_samples':
-            chunk_id = RZX_BLOCK_ID_INPUT_RECORDING
-
+            # Stream frames right to the output.
             frames = chunk['frames']
-            chunk_writer.write(['<L:num_of_frames', 'B:reserved',
-                                '<L:first_tick', '<L:flags'],
-                               num_of_frames=len(frames), reserved=0,
-                               first_tick=0,  # TODO
-                               flags=0,  # Not protected. Not compressed.
-                               )
+            size = 5 + 13 + sum(4 + len(samples) for _, samples in frames)
+            writer.write(['B:id', '<L:size'],
+                         id=RZX_BLOCK_ID_INPUT_RECORDING, size=size)
+
+            writer.write(['<L:num_of_frames', 'B:reserved',
+                          '<L:first_tick', '<L:flags'],
+                         num_of_frames=len(frames), reserved=0,
+                         first_tick=0,  # TODO
+                         flags=0,  # Not protected. Not compressed.
+                         )
 
             for num_of_fetches, samples in frames:
-                chunk_writer.write(['<H:num_of_fetches',
-                                    '<H:num_of_port_samples'],
-                                   num_of_fetches=num_of_fetches,
-                                   num_of_port_samples=len(samples))
-                chunk_writer.write_block(samples)
+                writer.write(['<H:num_of_fetches',
+                              '<H:num_of_port_samples'],
+                             num_of_fetches=num_of_fetches,
+                             num_of_port_samples=len(samples))
+                writer.write_block(samples)
+            continue
         else:
             assert 0, (id, list(chunk))  # TODO
 
+        image = chunk_writer.get_image()
         writer.write(['B:id', '<L:size'],
-                     id=chunk_id, size=len(chunk_writer.get_image()) + 4 + 1)
-        writer.write_block(chunk_writer.get_image())
+                     id=chunk_id, size=len(image) + 4 + 1)
+        writer.write_block(image)
 
-    return writer.get_image()
+
+def make_rzx(recording):
+    stream = io.BytesIO()
+    write_rzx(recording, stream)
+    return stream.getvalue()
 
 
 class RZXFile(Data):
@@ -9,8 +9,11 @@
 #   Published under the MIT license.
 
 
+import array
+import bisect
 from ._device import Device
 from ._device import EndOfFrame
+from ._device import GetTapeFrameEdges
 from ._device import GetTapeLevel
 from ._device import GetTapePlayerTime
 from ._device import IsTapePlayerPaused
@@ -101,9 +104,23 @@ class TapePlayer(Device):
         self._ticks_per_frame = 69888  # TODO
         self._time = Time()
 
+        # Ticks within the current frame at which the tape level
+        # flips, so that reading the level is a binary search.
+        self._frame_initial_level = False
+        self._frame_edges = array.array('i')
+
+        # Pulses are walked through ahead of the machine. To only
+        # report the end of tape once the machine gets there, we
+        # remember the tick at which the last pulse was fetched
+        # and the latest tick the machine is known to have reached.
+        self._end_tick = None
+        self._machine_tick = 0
+
     def is_paused(self):
         return self._is_paused
 
+    # The edges of the current frame are already walked, so the
+    # change takes effect at the next frame.
     def pause(self, is_paused=True):
         self._is_paused = is_paused
 
@@ -114,22 +131,30 @@ class TapePlayer(Device):
         self.pause(not self.is_paused())
 
     def is_end(self):
-        return self._pulses is None
+        return self._pulses is None and (self._end_tick is None or
+                                         self._end_tick < self._machine_tick)
 
+    # The time of the walked pulses, which is up to a frame
+    # ahead of the machine.
     def get_time(self):
         return self._time
 
     def load_parsed_file(self, file):
         self._pulses = file.get_pulses()
         self._level = False
+        self._end_tick = None
         self.pause()
 
+        # Restart the frame from the current tick. The new tape
+        # is paused, so the level stays low till the end of the
+        # frame.
+        self._frame_initial_level = False
+        self._frame_edges = array.array('i')
+
     def load_tape(self, file):
         self.load_parsed_file(file)
 
-    def get_level_at_frame_tick(self, tick):
-        assert self._tick <= tick, (self._tick, tick)
-
+    def __walk_to_tick(self, tick):
         while self._tick < tick:
             if self._is_paused:
                 self._tick = tick
@@ -147,34 +172,101 @@ class TapePlayer(Device):
             # Get subsequent pulse, if any.
             new_pulse = None
             if self._pulses:
-                for new_pulse in self._pulses:
-                    break
+                new_pulse = next(self._pulses, None)
 
             if new_pulse:
                 # print(new_pulse)
-                self._level, self._pulse, ids = new_pulse
+                level, self._pulse, ids = new_pulse
+                self.__set_level(level)
 
                 # The tape shall be considered stopped as soon as the last
                 # pulse is fetched, and not on the next attempt to fetch a
                 # pulse.
                 if 'END' in ids:
                     self._pulses = None
+                    self._end_tick = self._tick
 
                 continue
 
             # Do nothing, if there are no more pulses available.
-            self._pulses = None
-            self._level = False
+            if self._pulses is not None:
+                self._pulses = None
+                self._end_tick = self._tick
+            self.__set_level(False)
             self._tick = tick
 
-        return self._level
+    # A pulse fetched at tick T is seen by reads at ticks
+    # after T, so that is where the level flips. Flips of
+    # zero-length pulses cancel each other out.
+    def __set_level(self, level):
+        if level != self._level:
+            self._frame_edges.append(self._tick + 1)
+            self._level = level
+
+    def begin_frame(self):
+        self.__walk_to_tick(self._ticks_per_frame)
+
+    # Returns the level at the beginning of the frame, ticks at
+    # which it flips and the last tick they cover. Reads past
+    # the start of the last pulse shall come to us, so we can
+    # tell when the machine gets to the end of tape.
+    def get_frame_edges(self):
+        end_tick = self._tick
+        if self._end_tick is not None:
+            end_tick = min(end_tick, self._end_tick)
+        return self._frame_initial_level, self._frame_edges, end_tick
+
+    def get_level_at_frame_tick(self, tick):
+        self._machine_tick = max(self._machine_tick, tick)
+
+        # Reads past the end of frame are rare, but possible.
+        if tick > self._tick:
+            self.__walk_to_tick(tick)
+
+        edges = self._frame_edges
+        return bool(self._frame_initial_level ^
+                    (bisect.bisect_right(edges, tick) & 1))
+
+    # The machine is done with the frame.
+    def __shift_end_tick(self):
+        self._machine_tick = max(
+            self._machine_tick - self._ticks_per_frame, 0)
+        if self._end_tick is not None:
+            self._end_tick -= self._ticks_per_frame
+            if self._end_tick < 0:
+                self._end_tick = None
 
     def skip_rest_of_frame(self):
+        # Without a tape to play, the level stays low and there
+        # is nothing to walk through.
+        if (self._pulses is None and not self._pulse and
+                not self._level and not self._frame_edges):
+            self._tick = max(self._tick - self._ticks_per_frame,
+                             self._ticks_per_frame)
+            self.__shift_end_tick()
+            return
+
         if self._tick < self._ticks_per_frame:
-            self.get_level_at_frame_tick(self._ticks_per_frame)
+            self.__walk_to_tick(self._ticks_per_frame)
 
         assert self._tick >= self._ticks_per_frame
         self._tick -= self._ticks_per_frame
+        self.__shift_end_tick()
+
+        # Carry over the edges that are already past the end of
+        # frame.
+        end = self._ticks_per_frame
+        edges = self._frame_edges
+        i = bisect.bisect_right(edges, end)
+        self._frame_initial_level ^= i & 1
+        self._frame_edges = array.array('i', (t - end for t in edges[i:]))
+
+        self.begin_frame()
+
+    def get_event_types(self):
+        return (EndOfFrame, GetTapePlayerTime, GetTapeLevel,
+                GetTapeFrameEdges, IsTapePlayerPaused, IsTapePlayerStopped,
+                LoadTape, PauseUnpauseTape)
 
     def on_event(self, event, devices, result):
         if isinstance(event, EndOfFrame):
@@ -183,6 +275,8 @@ class TapePlayer(Device):
             return self.get_time()
         elif isinstance(event, GetTapeLevel):
             return self.get_level_at_frame_tick(event.frame_tick)
+        elif isinstance(event, GetTapeFrameEdges):
+            return self.get_frame_edges()
         elif isinstance(event, IsTapePlayerPaused):
             return self.is_paused()
         elif isinstance(event, IsTapePlayerStopped):